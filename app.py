@@ -1,15 +1,33 @@
 #!/usr/bin/env python3
 # searchbox.py — One-file Local Document Search Engine (BM25) with Web UI
 # Zero dependencies. Indexes .md .txt .html, serves a fast UI + JSON API.
+# If numba (and numpy) happen to be installed, scoring runs in a parallel JIT kernel.
 # Usage: python3 searchbox.py /path/to/folder --port 8000
-import os, re, sys, json, math, time, html, mimetypes, urllib.parse, argparse, threading
-from http.server import HTTPServer, BaseHTTPRequestHandler
+import os, re, sys, json, math, time, html, heapq, bisect, mmap, mimetypes, urllib.parse, argparse, threading, contextlib
+from array import array
+from collections import Counter, deque
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+try:                        # optional: JIT scoring kernel, pure Python otherwise
+    import numpy as np
+    from numba import njit, prange
+except ImportError:
+    np = njit = None
 
 ###############################################################################
 #                                INDEXER                                      #
 ###############################################################################
 
 TOKEN_RE = re.compile(r"[A-Za-z0-9]+", re.UNICODE)
+_RE_SCRIPT = re.compile(r"<script.*?>.*?</script>", re.I | re.S)
+_RE_STYLE = re.compile(r"<style.*?>.*?</style>", re.I | re.S)
+_RE_TAG = re.compile(r"<[^>]+>", re.S)
+BM25_K1, BM25_B = 1.5, 0.75
+DOC_EXTS = {".md", ".txt", ".html", ".htm"}
+POLL_INTERVAL = 2.0         # seconds between change polls from /search
+JSON_STREAM_MIN = 1000      # /search result lists longer than this are streamed
 
 def read_text(path):
     # Read text with safe fallback encodings
@@ -23,12 +41,19 @@ def read_text(path):
 
 def strip_html(text):
     # crude but effective stripping for .html
-    text = re.sub(r"(?is)<script.*?>.*?</script>", " ", text)
-    text = re.sub(r"(?is)<style.*?>.*?</style>", " ", text)
-    text = re.sub(r"(?is)<[^>]+>", " ", text)
+    text = _RE_SCRIPT.sub(" ", text)
+    text = _RE_STYLE.sub(" ", text)
+    text = _RE_TAG.sub(" ", text)
     return html.unescape(text)
 
 def tokenize(text):
+    # not interned: on CPython 3.12 interned strings are immortal, and query
+    # words and vanished terms must stay collectable. reindex() keeps one copy
+    # of each term as a vocab key; documents are stored as term ids.
+    # ASCII text is lowercased in one C pass; elsewhere str.lower() could turn
+    # non-ASCII letters (e.g. the Kelvin sign) into new ASCII tokens.
+    if text.isascii():
+        return TOKEN_RE.findall(text.lower())
     return [t.lower() for t in TOKEN_RE.findall(text)]
 
 def file_to_text(path):
@@ -39,96 +64,370 @@ def file_to_text(path):
     return raw
 
 def walk_docs(root):
-    exts = {".md", ".txt", ".html", ".htm"}
     for base, _, files in os.walk(root):
         for fn in files:
-            if os.path.splitext(fn)[1].lower() in exts:
+            if os.path.splitext(fn)[1].lower() in DOC_EXTS:
                 p = os.path.join(base, fn)
                 yield p
 
+def load_doc(path):
+    # (path, title, mtime, term freqs, token count), or None if unreadable.
+    # mtime is taken before reading so a concurrent edit is picked up next poll
+    try:
+        mtime = os.path.getmtime(path)
+        toks = tokenize(file_to_text(path))
+        freq = Counter(toks)
+        return path, os.path.basename(path), mtime, freq, len(toks)
+    except Exception:
+        return None
+
+def tree_changed(root, known):
+    # True as soon as a doc is new or has a different mtime than in known
+    # (path -> mtime); same traversal rules as walk_docs (no dir symlinks)
+    seen = 0
+    stack = [root]
+    while stack:
+        try:
+            it = os.scandir(stack.pop())
+        except OSError:
+            continue
+        with it:
+            for e in it:
+                try:
+                    if e.is_dir():
+                        if not e.is_symlink():
+                            stack.append(e.path)
+                        continue
+                    if os.path.splitext(e.name)[1].lower() not in DOC_EXTS:
+                        continue
+                    if known.get(e.path) != e.stat().st_mtime:
+                        return True
+                except OSError:
+                    # e.g. a dangling symlink: reindex() can't load it either
+                    continue
+                seen += 1
+    return seen != len(known)
+
+def bm25_accumulate(acc, weight, lo, hi, post_docs, post_freqs, len_norm):
+    # add one term's BM25 contribution for postings[lo:hi] into acc (doc id -> score)
+    # weight = idf * (k1 + 1) * query term count, hoisted by the caller
+    ids = post_docs[lo:hi]
+    contrib = [weight * f / (f + len_norm[i]) for i, f in zip(ids, post_freqs[lo:hi])]
+    get = acc.get
+    for i, c in zip(ids, contrib):
+        acc[i] = get(i, 0.0) + c
+
+if njit is not None:
+    @njit(parallel=True, cache=True)
+    def _bm25_accumulate_jit(acc, weights, los, his, post_docs, post_freqs, len_norm):
+        # bm25_accumulate for every query term in one launch, into a dense acc
+        # (one float per doc); doc ids are unique within a posting list, so the
+        # parallel writes for one term never collide
+        for t in range(len(weights)):
+            weight = weights[t]
+            for j in prange(los[t], his[t]):
+                i = post_docs[j]
+                f = post_freqs[j]
+                acc[i] += weight * f / (f + len_norm[i])
+else:
+    _bm25_accumulate_jit = None
+# numba's default workqueue threading layer aborts the process on concurrent
+# parallel launches, and searches run on many server threads: one at a time
+_jit_lock = threading.Lock()
+
+class RWLock:
+    # many concurrent readers or one writer; waiting writers block new readers
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = False
+        self._waiting_writers = 0
+
+    @contextlib.contextmanager
+    def read(self):
+        with self._cond:
+            while self._writer or self._waiting_writers:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+
+    @contextlib.contextmanager
+    def write(self):
+        with self._cond:
+            self._waiting_writers += 1
+            while self._writer or self._readers:
+                self._cond.wait()
+            self._waiting_writers -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer = False
+                self._cond.notify_all()
+
 class BM25Index:
     def __init__(self, root):
         self.root = os.path.abspath(root)
-        self.lock = threading.Lock()
+        self.lock = RWLock()
+        self._build_lock = threading.Lock()  # one rebuild at a time
+        self.docs = []              # list of dicts: {id, path, title, mtime, len}; text stays on disk
+        self._rows = []             # doc id -> (term ids, freqs) as array('i'), kept across builds
+        self.vocab = {}             # term -> term id; stable across builds until compacted
+        self.df = array("i")        # term id -> doc freq
+        self.post_offsets = array("i", [0])  # term id -> slice into post_docs/post_freqs
+        self.post_docs = array("i")          # concatenated postings, doc ids ascending
+        self.post_freqs = array("i")
+        self.idf, self.doc_len, self.len_norm, self.avgdl = [], [], array("d"), 0.0
+        self._mtimes, self.paths = {}, frozenset()
         self.reindex()
 
     def reindex(self):
-        with self.lock:
-            self.docs = []          # list of dicts: {id, path, title, text, tokens, mtime, len}
-            self.df = {}            # term -> doc freq
-            self.tf = []            # list of dict: term -> frequency in that doc
-            self.avgdl = 0.0
-            self.idf = {}           # computed later
-            self.last_build = time.time()
-
-            for i, path in enumerate(walk_docs(self.root)):
+        # incremental: only new or modified files are read + tokenized, and only
+        # the postings of terms they touch are rebuilt. Everything is built into
+        # locals without blocking searches, then swapped under the write lock.
+        with self._build_lock:
+            built = time.time()
+            old_docs, old_rows = self.docs, self._rows
+            old_id = {d["path"]: i for i, d in enumerate(old_docs)}
+            paths = list(walk_docs(self.root))
+            stale = []
+            for path in paths:
+                i = old_id.get(path)
                 try:
-                    text = file_to_text(path)
-                    title = os.path.basename(path)
-                    toks = tokenize(text)
-                    freq = {}
-                    for t in toks:
-                        freq[t] = freq.get(t, 0) + 1
-                    for term in freq.keys():
-                        self.df[term] = self.df.get(term, 0) + 1
-                    self.docs.append({
-                        "id": i, "path": path, "title": title, "text": text,
-                        "mtime": os.path.getmtime(path), "len": len(toks)
-                    })
-                    self.tf.append(freq)
-                except Exception:
-                    continue
-
-            N = len(self.docs) or 1
-            self.avgdl = sum(d["len"] for d in self.docs)/N
-            # BM25 IDF
-            for term, df in self.df.items():
-                # BM25+ like IDF with 0.5 add-one
-                self.idf[term] = math.log((N - df + 0.5) / (df + 0.5) + 1.0)
+                    if i is not None and old_docs[i]["mtime"] == os.path.getmtime(path):
+                        continue
+                except OSError:
+                    pass
+                stale.append(path)
+            # each loaded Counter is turned into compact term-id rows right away;
+            # at most `window` loads are in flight, so that many Counters at most
+            vocab, df = dict(self.vocab), array("i", self.df)
+            fresh = {}              # path -> (title, mtime, n, term ids, freqs) or None
+            workers = os.cpu_count() or 1
+            window = workers * 4
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                pending = deque()
+                todo = iter(stale)
+                for path in islice(todo, window):
+                    pending.append((path, pool.submit(load_doc, path)))
+                while pending:
+                    path, fut = pending.popleft()
+                    doc = fut.result()
+                    for nxt_path in islice(todo, 1):
+                        pending.append((nxt_path, pool.submit(load_doc, nxt_path)))
+                    if doc is not None:
+                        _, title, mtime, freq, n = doc
+                        for term in freq:
+                            if term not in vocab:
+                                vocab[term] = len(vocab)
+                                df.append(0)
+                        doc = (title, mtime, n, array("i", map(vocab.__getitem__, freq)),
+                               array("i", freq.values()))
+                    fresh[path] = doc
+            present = set(paths)
+            # old ids whose row goes away: deleted, or no longer readable
+            gone = [i for p, i in old_id.items() if p not in present or (p in fresh and fresh[p] is None)]
+            changed = [p for p in stale if fresh[p] is not None]
+            if not gone and not changed:
+                self.last_build = self._last_poll = built
+                return
+
+            # fresh rows: modified docs keep their slot, new docs are appended;
+            # ids only shift when docs are removed (remapped below)
+            drops = {}              # term id -> old doc ids to remove from its postings
+            for i in gone + [old_id[p] for p in changed if p in old_id]:
+                for tid in old_rows[i][0]:
+                    df[tid] -= 1
+                    drops.setdefault(tid, []).append(i)
+            docs, rows = list(old_docs), list(old_rows)
+            slots = []              # (doc id, term ids, freqs) of every fresh doc
+            for path in changed:
+                title, mtime, n, terms, freqs = fresh[path]
+                i = old_id.get(path, len(docs))
+                doc = {"id": i, "path": path, "title": title, "mtime": mtime, "len": n}
+                if i == len(docs):
+                    docs.append(doc)
+                    rows.append((terms, freqs))
+                else:
+                    docs[i], rows[i] = doc, (terms, freqs)
+                slots.append((i, terms, freqs))
+            # fresh entries grouped by term with a counting sort into two flat
+            # buffers (add_start[tid] + add_count[tid] slices), docs ascending
+            add_count = Counter()
+            for _, terms, _ in slots:
+                add_count.update(terms)
+            add_start, pos = {}, 0
+            for tid, c in add_count.items():
+                df[tid] += c
+                add_start[tid] = pos
+                pos += c
+            add_ids, add_freqs = array("i", bytes(4 * pos)), array("i", bytes(4 * pos))
+            fill = dict(add_start)
+            slots.sort(key=lambda s: s[0])
+            for i, terms, freqs in slots:
+                for tid, f in zip(terms, freqs):
+                    p = fill[tid]
+                    add_ids[p] = i
+                    add_freqs[p] = f
+                    fill[tid] = p + 1
+            del fill, slots
+
+            # postings: unaffected runs of terms are copied slice-wise; affected
+            # terms drop stale entries and merge in fresh ones, kept ascending
+            old_off, old_pd, old_pf = self.post_offsets, self.post_docs, self.post_freqs
+            post_offsets, post_docs, post_freqs = array("i", [0]), array("i"), array("i")
+
+            def copy_run(a, b):
+                # terms [a, b) are untouched: copy their postings, shift offsets
+                if a >= b:
+                    return
+                lo, hi = old_off[a], old_off[b]
+                delta = len(post_docs) - lo
+                post_docs.extend(old_pd[lo:hi])
+                post_freqs.extend(old_pf[lo:hi])
+                post_offsets.extend(o + delta for o in old_off[a + 1:b + 1])
+
+            old_v, nxt = len(old_off) - 1, 0
+            for tid in sorted(drops.keys() | add_start.keys()):
+                copy_run(nxt, min(tid, old_v))
+                if tid < old_v:
+                    ids, freqs = old_pd[old_off[tid]:old_off[tid + 1]], old_pf[old_off[tid]:old_off[tid + 1]]
+                else:
+                    ids, freqs = array("i"), array("i")
+                for i in drops.get(tid, ()):
+                    p = bisect.bisect_left(ids, i)
+                    del ids[p], freqs[p]
+                lo = add_start.get(tid, 0)
+                new_ids, new_freqs = add_ids[lo:lo + add_count[tid]], add_freqs[lo:lo + add_count[tid]]
+                if not ids or (new_ids and new_ids[0] > ids[-1]):
+                    ids.extend(new_ids)
+                    freqs.extend(new_freqs)
+                else:
+                    for i, f in zip(new_ids, new_freqs):
+                        p = bisect.bisect_left(ids, i)
+                        ids.insert(p, i)
+                        freqs.insert(p, f)
+                post_docs.extend(ids)
+                post_freqs.extend(freqs)
+                post_offsets.append(len(post_docs))
+                nxt = tid + 1
+            copy_run(nxt, old_v)
+
+            if gone:
+                # compact doc ids; the mapping is monotonic so postings stay sorted
+                dead = set(gone)
+                remap, keep = [], 0
+                for i in range(len(docs)):
+                    remap.append(-1 if i in dead else keep)
+                    keep += i not in dead
+                post_docs = array("i", map(remap.__getitem__, post_docs))
+                docs = [d for i, d in enumerate(docs) if i not in dead]
+                rows = [r for i, r in enumerate(rows) if i not in dead]
+                docs = [dict(d, id=i) for i, d in enumerate(docs)]
+
+            dead_terms = df.count(0)
+            if dead_terms * 2 > len(df):
+                # most term ids belong to vanished terms: renumber the live ones.
+                # Dead terms have empty posting slices, so only offsets change.
+                live = [tid for tid, n in enumerate(df) if n]
+                tid_map = [-1] * len(df)
+                for new, tid in enumerate(live):
+                    tid_map[tid] = new
+                vocab = {t: tid_map[tid] for t, tid in vocab.items() if df[tid]}
+                df = array("i", map(df.__getitem__, live))
+                post_offsets = array("i", [0]) + array("i", (post_offsets[tid + 1] for tid in live))
+                rows = [(array("i", map(tid_map.__getitem__, terms)), freqs) for terms, freqs in rows]
+
+            N = len(docs) or 1
+            doc_len = [d["len"] for d in docs]
+            avgdl = sum(doc_len)/N
+            k1, b = BM25_K1, BM25_B
+            # k1 * (1 - b + b*dl/avgdl) per doc, fixed until the next reindex
+            len_norm = array("d", (k1 * (1 - b + b * dl/(avgdl or 1.0)) for dl in doc_len))
+            # BM25+ like IDF with 0.5 add-one, by term id
+            idf = [math.log((N - n + 0.5) / (n + 0.5) + 1.0) for n in df]
+
+            with self.lock.write():
+                self.docs, self._rows, self.df, self.idf, self.vocab = docs, rows, df, idf, vocab
+                self.post_offsets, self.post_docs, self.post_freqs = post_offsets, post_docs, post_freqs
+                self.doc_len, self.len_norm, self.avgdl = doc_len, len_norm, avgdl
+                self._mtimes = {d["path"]: d["mtime"] for d in docs}
+                self.paths = frozenset(self._mtimes)  # only these may be served
+                self.last_build = self._last_poll = built
 
     def maybe_reindex(self):
-        # quick poll: if any mtime changed or new files exist, rebuild
-        with self.lock:
-            try:
-                snapshot = [(p, os.path.getmtime(p)) for p in walk_docs(self.root)]
-            except Exception:
-                snapshot = []
-            have = {(d["path"], d["mtime"]) for d in self.docs}
-            now = set(snapshot)
-        if now != have:
+        # throttled poll, lock-free: _mtimes is replaced, never mutated
+        now = time.time()
+        if now - self._last_poll < POLL_INTERVAL:
+            return
+        self._last_poll = now
+        if tree_changed(self.root, self._mtimes):
             self.reindex()
 
-    def score(self, q_terms, doc_idx, k1=1.5, b=0.75):
-        with self.lock:
-            d = self.docs[doc_idx]
-            freq = self.tf[doc_idx]
-            score = 0.0
-            for t in q_terms:
-                if t not in freq:
-                    continue
-                idf = self.idf.get(t, 0.0)
-                tf = freq[t]
-                dl = d["len"] or 1
-                denom = tf + k1 * (1 - b + b * dl/self.avgdl)
-                score += idf * (tf * (k1 + 1)) / denom
-            return score
+    def score(self, q_terms, doc_idx, k1=BM25_K1, b=BM25_B):
+        # lock-free; callers scoring many docs while a reindex may run should
+        # hold self.lock.read() once around the whole loop
+        row = dict(zip(*self._rows[doc_idx]))
+        k1p1 = k1 + 1
+        if k1 == BM25_K1 and b == BM25_B:
+            norm = self.len_norm[doc_idx]
+        else:
+            norm = k1 * (1 - b + b * self.doc_len[doc_idx]/(self.avgdl or 1.0))
+        score = 0.0
+        for t in q_terms:
+            tid = self.vocab.get(t)
+            tf = row.get(tid)
+            if tf:
+                score += self.idf[tid] * (tf * k1p1) / (tf + norm)
+        return score
 
     def search(self, query, limit=20):
         self.maybe_reindex()
         q_terms = tokenize(query)
         if not q_terms:
             return []
-        scores = []
-        with self.lock:
-            for i, d in enumerate(self.docs):
-                s = self.score(q_terms, i)
-                if s > 0:
-                    scores.append((s, i))
-        scores.sort(reverse=True, key=lambda x: x[0])
+        k1p1 = BM25_K1 + 1
+        # snapshot under the read lock; reindex swaps in new objects and never
+        # mutates these, so scoring runs lock-free on a consistent index
+        with self.lock.read():
+            docs, offsets, vocab, idf = self.docs, self.post_offsets, self.vocab, self.idf
+            post_docs, post_freqs, len_norm = self.post_docs, self.post_freqs, self.len_norm
+        # per-query constants; repeated query terms count once per occurrence
+        q = [(idf[vocab[t]] * k1p1 * n, vocab[t]) for t, n in Counter(q_terms).items() if t in vocab]
+        if _bm25_accumulate_jit is not None and q:
+            # zero-copy views of the array('i'/'d') buffers for the JIT kernel
+            dense = np.zeros(len(docs))
+            pd = np.frombuffer(post_docs, dtype=np.intc)
+            pf = np.frombuffer(post_freqs, dtype=np.intc)
+            ln = np.frombuffer(len_norm, dtype=np.float64)
+            weights = np.array([w for w, _ in q])
+            los = np.array([offsets[tid] for _, tid in q], dtype=np.intc)
+            his = np.array([offsets[tid + 1] for _, tid in q], dtype=np.intc)
+            with _jit_lock:
+                _bm25_accumulate_jit(dense, weights, los, his, pd, pf, ln)
+            hits = np.flatnonzero(dense > 0)
+            acc = dict(zip(hits.tolist(), dense[hits].tolist()))
+        else:
+            acc = {}                # doc id -> score, only docs with a hit
+            for weight, tid in q:
+                bm25_accumulate(acc, weight, offsets[tid], offsets[tid + 1],
+                                post_docs, post_freqs, len_norm)
+        # O(M log limit) selection instead of sorting every matching doc;
+        # ties go to the lower doc id, like the stable sort this replaces
+        top = heapq.nlargest(limit, ((s, i) for i, s in acc.items() if s > 0), key=lambda x: (x[0], -x[1]))
         results = []
-        for s, i in scores[:limit]:
-            d = self.docs[i]
-            snippet = make_snippet(d["text"], q_terms, 240)
+        qset = set(q_terms)
+        hit_re = hit_pattern(qset)
+        for s, i in top:
+            d = docs[i]
+            snippet = doc_snippet(d["path"], q_terms, 240, qset, hit_re)
             results.append({
                 "title": d["title"],
                 "path": os.path.relpath(d["path"], self.root),
@@ -143,28 +442,62 @@ class BM25Index:
 ###############################################################################
 
 def first_hit_span(text, terms):
-    low = text.lower()
-    positions = []
-    for t in terms:
-        p = low.find(t)
-        if p != -1:
-            positions.append(p)
-    return min(positions) if positions else 0
-
-def make_snippet(text, terms, width=220):
+    # leftmost hit of any term in one scan, without a lowercased copy of text
+    m = re.compile("|".join(re.escape(t) for t in sorted(set(terms))), re.I).search(text)
+    return m.start() if m else 0
+
+def make_snippet(text, terms, width=220, qset=None):
     # pick window around first match
     pos = first_hit_span(text, terms)
     start = max(0, pos - width // 4)
     end = min(len(text), start + width)
     chunk = text[start:end]
 
-    # escape + highlight
-    esc = html.escape(chunk)
-    for t in sorted(set(terms), key=len, reverse=True):
-        esc = re.sub(fr"(?i)\b({re.escape(t)})\b", r"<mark>\1</mark>", esc)
+    if qset is None:
+        qset = {t.lower() for t in terms}
     prefix = "…" if start > 0 else ""
     suffix = "…" if end < len(text) else ""
-    return prefix + esc + suffix
+    return prefix + highlight(chunk, qset) + suffix
+
+def highlight(chunk, qset):
+    # escape + highlight in one pass over the same tokens the index uses
+    out, last, esc = [], 0, html.escape
+    for m in TOKEN_RE.finditer(chunk):
+        tok = m.group()
+        if tok.lower() in qset:
+            out.append(esc(chunk[last:m.start()]))
+            out.append("<mark>" + esc(tok) + "</mark>")
+            last = m.end()
+    out.append(esc(chunk[last:]))
+    return "".join(out)
+
+def hit_pattern(terms):
+    # case-insensitive byte pattern for locating the first hit in a raw file
+    return re.compile(b"|".join(re.escape(t.encode("ascii")) for t in sorted(set(terms))), re.I)
+
+def doc_snippet(path, terms, width=220, qset=None, hit_re=None):
+    # doc text is not kept in memory: HTML is re-extracted, plain text is
+    # mmapped and only the window around the first hit is decoded
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".html" or ext == ".htm":
+        return make_snippet(file_to_text(path), terms, width, qset)
+    if qset is None:
+        qset = {t.lower() for t in terms}
+    try:
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            m = (hit_re or hit_pattern(qset)).search(mm)
+            pos = m.start() if m else 0
+            start = max(0, pos - width // 4)
+            end = min(len(mm), start + width)
+            chunk = mm[start:end].decode("utf-8", "ignore")
+            size = len(mm)
+    except (OSError, ValueError):
+        return ""
+    if start == 0:
+        chunk = chunk.lstrip("\ufeff")
+    prefix = "…" if start > 0 else ""
+    suffix = "…" if end < size else ""
+    return prefix + highlight(chunk, qset) + suffix
 
 ###############################################################################
 #                                WEB SERVER                                   #
@@ -266,20 +599,70 @@ q.addEventListener('input', ()=>{ history.replaceState(null,'','#'+encodeURIComp
 class App(BaseHTTPRequestHandler):
     index: BM25Index = None  # attached later
 
-    def _send(self, code=200, ctype="text/html; charset=utf-8"):
+    protocol_version = "HTTP/1.1"  # keep-alive; every reply is length-delimited or chunked
+
+    def _send(self, code=200, ctype="text/html; charset=utf-8", length=None):
         self.send_response(code)
         self.send_header("Content-Type", ctype)
         self.send_header("Cache-Control", "no-store")
+        # no length: chunked for HTTP/1.1 clients, close-delimited for HTTP/1.0
+        self._chunked = length is None and self.request_version == "HTTP/1.1"
+        if length is not None:
+            self.send_header("Content-Length", str(length))
+        elif self._chunked:
+            self.send_header("Transfer-Encoding", "chunked")
+        else:
+            self.close_connection = True
         self.end_headers()
 
+    def _reply(self, body, code=200, ctype="text/html; charset=utf-8"):
+        self._send(code, ctype, len(body))
+        self.wfile.write(body)
+
+    def _write_chunk(self, data):
+        if self._chunked:
+            data = b"%x\r\n%s\r\n" % (len(data), data)
+        self.wfile.write(data)
+
+    def _write_json_list(self, items, bufsize=1 << 16):
+        # small lists: one json.dumps (C encoder) with a Content-Length. Large
+        # ones are streamed, each item still encoded by json.dumps, and pieces
+        # coalesced since wfile is unbuffered
+        ctype = "application/json; charset=utf-8"
+        if len(items) <= JSON_STREAM_MIN:
+            self._reply(json.dumps(items).encode("utf-8"), ctype=ctype)
+            return
+        self._send(ctype=ctype)
+        buf, size, sep = ["["], 1, ""
+        for item in items:
+            piece = sep + json.dumps(item)
+            sep = ", "
+            buf.append(piece)
+            size += len(piece)
+            if size >= bufsize:
+                self._write_chunk("".join(buf).encode("utf-8"))
+                buf, size = [], 0
+        buf.append("]")
+        self._write_chunk("".join(buf).encode("utf-8"))
+        if self._chunked:
+            self.wfile.write(b"0\r\n\r\n")
+
+    def _indexed_path(self, qs):
+        # resolve ?path= to an indexed document, or None; membership in the
+        # index replaces prefix checks, so ../ or absolute paths can't escape
+        rel = (qs.get("path", [""])[0]).replace("\\", "/")
+        abs_path = os.path.normpath(os.path.join(self.index.root, rel))
+        if abs_path in self.index.paths and os.path.exists(abs_path):
+            return abs_path
+        return None
+
     def do_GET(self):
         parsed = urllib.parse.urlparse(self.path)
         path = parsed.path
         qs = urllib.parse.parse_qs(parsed.query)
 
         if path == "/":
-            self._send()
-            self.wfile.write(INDEX_HTML.encode("utf-8"))
+            self._reply(INDEX_HTML.encode("utf-8"))
             return
 
         if path == "/search":
@@ -288,44 +671,40 @@ class App(BaseHTTPRequestHandler):
             t0 = time.time()
             results = self.index.search(query, limit=limit)
             took = (time.time() - t0) * 1000
-            self._send(ctype="application/json; charset=utf-8")
-            self.wfile.write(json.dumps(results).encode("utf-8"))
+            self._write_json_list(results)
             return
 
         if path == "/reindex":
             self.index.reindex()
-            self._send(ctype="application/json; charset=utf-8")
-            self.wfile.write(json.dumps({"status": "ok", "docs": len(self.index.docs)}).encode("utf-8"))
+            self._reply(json.dumps({"status": "ok", "docs": len(self.index.docs)}).encode("utf-8"),
+                        ctype="application/json; charset=utf-8")
             return
 
         if path == "/raw":
             # serve raw file for quick view
-            rel = (qs.get("path", [""])[0]).replace("\\", "/")
-            abs_path = os.path.abspath(os.path.join(self.index.root, rel))
-            if not abs_path.startswith(self.index.root) or not os.path.exists(abs_path):
-                self._send(404); self.wfile.write(b"Not found"); return
+            abs_path = self._indexed_path(qs)
+            if abs_path is None:
+                self._reply(b"Not found", 404); return
             ctype = mimetypes.guess_type(abs_path)[0] or "text/plain; charset=utf-8"
-            self._send(ctype=ctype)
             try:
                 with open(abs_path, "rb") as f:
-                    self.wfile.write(f.read())
+                    data = f.read()
             except Exception:
-                self.wfile.write(b"")
+                data = b""
+            self._reply(data, ctype=ctype)
             return
 
         if path == "/open":
             # open in system file browser where possible
-            rel = (qs.get("path", [""])[0]).replace("\\", "/")
-            abs_path = os.path.abspath(os.path.join(self.index.root, rel))
-            if not abs_path.startswith(self.index.root) or not os.path.exists(abs_path):
-                self._send(404); self.wfile.write(b"Not found"); return
-            self._send(ctype="application/json; charset=utf-8")
+            abs_path = self._indexed_path(qs)
+            if abs_path is None:
+                self._reply(b"Not found", 404); return
             threading.Thread(target=open_in_folder, args=(abs_path,), daemon=True).start()
-            self.wfile.write(json.dumps({"status":"opening"}).encode("utf-8"))
+            self._reply(json.dumps({"status":"opening"}).encode("utf-8"), ctype="application/json; charset=utf-8")
             return
 
         # 404
-        self._send(404); self.wfile.write(b"Not found")
+        self._reply(b"Not found", 404)
 
 def open_in_folder(path):
     try:
@@ -363,7 +742,8 @@ def main():
     print(f"Serving  http://localhost:{args.port}")
     print("API:     /search?q=hello   •  Reindex: /reindex   •  Raw file: /raw?path=...")
 
-    httpd = HTTPServer(("0.0.0.0", args.port), App)
+    # one thread per request; searches share the index under its read lock
+    httpd = ThreadingHTTPServer(("0.0.0.0", args.port), App)
     try:
         httpd.serve_forever()
     except KeyboardInterrupt:
@@ -0,0 +1,140 @@
+import json, os, sys, tempfile, threading, unittest, urllib.parse
+from http.client import HTTPConnection
+from http.server import ThreadingHTTPServer
+
+import app
+
+
+class IncrementalReindexTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = self.tmp.name
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, name, text):
+        with open(os.path.join(self.root, name), "w") as f:
+            f.write(text)
+
+    def test_empty_root_then_files_added(self):
+        idx = app.BM25Index(self.root)
+        self.assertEqual(idx.search("hello"), [])
+        self.assertFalse(idx.paths)
+        self.write("a.txt", "hello world")
+        idx._last_poll = 0      # skip the poll throttle
+        results = idx.search("hello")
+        self.assertEqual([r["path"] for r in results], ["a.txt"])
+
+    def test_dangling_symlink_does_not_trigger_reindex(self):
+        self.write("a.txt", "hello world")
+        os.symlink(os.path.join(self.root, "missing"), os.path.join(self.root, "broken.txt"))
+        idx = app.BM25Index(self.root)
+        calls = []
+        rebuild = idx.reindex
+        idx.reindex = lambda: (calls.append(1), rebuild())
+        for _ in range(3):
+            idx._last_poll = 0
+            self.assertEqual(len(idx.search("hello")), 1)
+        self.assertEqual(calls, [])
+        os.remove(os.path.join(self.root, "a.txt"))
+        idx._last_poll = 0
+        self.assertEqual(idx.search("hello"), [])
+        self.assertEqual(calls, [1])
+
+    def test_score_with_only_empty_docs(self):
+        self.write("empty.txt", "")
+        idx = app.BM25Index(self.root)
+        self.assertEqual(idx.avgdl, 0.0)
+        self.assertEqual(idx.score(["x"], 0), 0.0)
+        self.assertEqual(idx.score(["x"], 0, k1=1.2, b=0.5), 0.0)
+
+    def test_tied_scores_keep_doc_order(self):
+        self.write("a.txt", "yy zz")
+        self.write("b.txt", "xx zz")
+        idx = app.BM25Index(self.root)
+        by_id = [os.path.basename(d["path"]) for d in idx.docs]
+        for query in ("yy xx", "xx yy"):
+            results = idx.search(query)
+            self.assertEqual(results[0]["score"], results[1]["score"])
+            self.assertEqual([r["path"] for r in results], by_id)
+
+    def test_query_tokens_are_not_interned(self):
+        tok = app.tokenize("Zqxwvunseen")[0]
+        self.assertIsNot(sys.intern("zqxwv" + "unseen"), tok)
+
+    def test_vanished_terms_are_compacted(self):
+        idx = app.BM25Index(self.root)
+        path = os.path.join(self.root, "churn.txt")
+        for step in range(50):
+            self.write("churn.txt", f"uniq{step} shared")
+            os.utime(path, (step + 1, step + 1))
+            idx.reindex()
+        self.assertLessEqual(len(idx.vocab), 2 * sum(1 for n in idx.df if n))
+        self.assertEqual(len(idx.search("uniq49")), 1)
+        self.assertEqual(idx.search("uniq10"), [])
+        self.assertEqual(len(idx.search("shared")), 1)
+
+
+class IndexedPathTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = os.path.join(self.tmp.name, "docs")
+        evil = os.path.join(self.tmp.name, "docs-evil")
+        os.mkdir(self.root)
+        os.mkdir(evil)
+        for path, text in [(os.path.join(self.root, "a.txt"), "hello"),
+                           (os.path.join(self.root, "secret.py"), "token = 1"),
+                           (os.path.join(evil, "x.txt"), "hello")]:
+            with open(path, "w") as f:
+                f.write(text)
+        self.outside = os.path.join(evil, "x.txt")
+        app.App.index = app.BM25Index(self.root)
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), app.App)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        app.App.index = None
+        self.tmp.cleanup()
+
+    def get(self, path):
+        conn = HTTPConnection(*self.server.server_address)
+        try:
+            conn.request("GET", "/raw?path=" + urllib.parse.quote(path))
+            resp = conn.getresponse()
+            return resp.status, resp.read()
+        finally:
+            conn.close()
+
+    def test_indexed_doc_is_served(self):
+        self.assertEqual(self.get("a.txt"), (200, b"hello"))
+
+    def test_search_json_small_and_streamed(self):
+        expected = app.App.index.search("hello")
+        for stream_min in (app.JSON_STREAM_MIN, 0):
+            with self.subTest(stream_min=stream_min):
+                old, app.JSON_STREAM_MIN = app.JSON_STREAM_MIN, stream_min
+                try:
+                    conn = HTTPConnection(*self.server.server_address)
+                    conn.request("GET", "/search?q=hello")
+                    resp = conn.getresponse()
+                    body = resp.read()
+                    conn.close()
+                finally:
+                    app.JSON_STREAM_MIN = old
+                self.assertEqual(resp.status, 200)
+                self.assertEqual(resp.getheader("Transfer-Encoding") == "chunked", stream_min == 0)
+                self.assertEqual(json.loads(body), expected)
+
+    def test_paths_outside_the_index_are_rejected(self):
+        handler = app.App.__new__(app.App)
+        for rel in ["../docs-evil/x.txt", "secret.py", self.outside]:
+            with self.subTest(path=rel):
+                self.assertIsNone(handler._indexed_path({"path": [rel]}))
+                self.assertEqual(self.get(rel)[0], 404)
+
+
+if __name__ == "__main__":
+    unittest.main()